@@ -1,23 +1,33 @@
 import os
+import errno
 import json
-import hashlib
+import heapq
 import requests
 import sys
 import time
 from pathlib import Path
 import shutil
 import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import re
 import unicodedata
+import urllib3
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
 try:
+    from .filelist import (
+        METADATA_PATH, dumps, generate_file_list, loads, replace_file,
+        write_metadata)
     from .paths import CONFIG_FILE
 except ImportError:  # pragma: no cover - direct execution fallback
     sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+    from syncz.filelist import (
+        METADATA_PATH, dumps, generate_file_list, loads, replace_file,
+        write_metadata)
     from syncz.paths import CONFIG_FILE
 try:
     from wcwidth import wcwidth as _wcwidth, wcswidth as _wcswidth
@@ -77,57 +87,149 @@ def format_file_size(size_bytes):
         return f"{size:.2f} {size_names[i]}"
 
 
+# Min-heap of [deleted_at, relpath, inode, ctime_ns] entries kept inside the
+# deleted folder; inode and ctime_ns identify the file that was moved there
+DELETED_INDEX = ".index.json"
+
+
+def _deleted_entry(deleted_at, rel, st):
+    return [deleted_at, rel, st.st_ino, st.st_ctime_ns]
+
+
+def _is_indexed_file(entry, st, cutoff):
+    """True if st is still the file entry recorded, not a later one at rel"""
+    if len(entry) >= 4:
+        return entry[2] == st.st_ino and entry[3] == st.st_ctime_ns
+    # Entries from older indexes carry no identity; the rename into
+    # deleted/ sets ctime, so a file moved there since has a newer one
+    return st.st_ctime < cutoff
+
+
+def load_deleted_index(deleted_dir):
+    """Return the eviction heap for deleted_dir, or None if there is none"""
+    try:
+        with open(os.path.join(deleted_dir, DELETED_INDEX), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        return index if isinstance(index, list) else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_deleted_index(deleted_dir, index):
+    try:
+        with open(os.path.join(deleted_dir, DELETED_INDEX), "w", encoding="utf-8") as f:
+            f.write(json.dumps(index, separators=(",", ":")))
+    except OSError as e:
+        print(ctext(f"  ⚠️  Could not save deleted index: {e}", Fore.RED))
+
+
+def rebuild_deleted_index(deleted_dir):
+    """Walk deleted_dir once to index files moved there before the index existed"""
+    index = []
+    pending_dirs = [(deleted_dir, "")]
+    while pending_dirs:
+        dirpath, prefix = pending_dirs.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                dir_entries = list(it)
+        except OSError:
+            continue
+        for entry in dir_entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending_dirs.append((entry.path, prefix + entry.name + os.sep))
+                continue
+            if entry.name in (".deleted_info.json", DELETED_INDEX):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+                index.append(_deleted_entry(st.st_mtime, prefix + entry.name, st))
+            except OSError:
+                continue
+    heapq.heapify(index)
+    return index
+
+
 def clean_old_deleted_files(deleted_dir="deleted", days=10):
-    """Remove files from deleted directory that are older than specified days"""
+    """Remove files from deleted directory that are older than specified days.
+
+    Returns the remaining index so callers can hand it to move_to_deleted.
+    """
     if not os.path.exists(deleted_dir):
-        return
+        return []
 
-    cutoff_date = datetime.now() - timedelta(days=days)
-    deleted_count = 0
+    index = load_deleted_index(deleted_dir)
+    rebuilt = index is None
+    if rebuilt:
+        index = rebuild_deleted_index(deleted_dir)
 
-    for root, dirs, files in os.walk(deleted_dir):
-        for file in files:
-            if file == ".deleted_info.json":
+    # Only the expired head of the heap is touched; no directory walk
+    cutoff = time.time() - timedelta(days=days).total_seconds()
+    deleted_count = 0
+    evicted = False
+    while index and index[0][0] < cutoff:
+        entry = heapq.heappop(index)
+        evicted = True
+        rel = entry[1]
+        file_path = os.path.join(deleted_dir, rel)
+        try:
+            # Drop the entry without deleting if rel now holds another file
+            # (e.g. restored from the bin and deleted again)
+            if not _is_indexed_file(entry, os.lstat(file_path), cutoff):
                 continue
-            file_path = os.path.join(root, file)
-            try:
-                # Check file modification time
-                file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if file_mtime < cutoff_date:
-                    os.remove(file_path)
-                    deleted_count += 1
-                    rel = os.path.relpath(file_path, deleted_dir)
-                    print(ctext(
-                        f"  🗑️  Permanently deleted old file: {rel}",
-                        Fore.YELLOW,
-                    ))
-            except Exception as e:
-                print(ctext(f"  ⚠️  Could not delete {file_path}: {e}", Fore.RED))
+            os.remove(file_path)
+            deleted_count += 1
+            print(ctext(
+                f"  🗑️  Permanently deleted old file: {rel}",
+                Fore.YELLOW,
+            ))
+        except FileNotFoundError:
+            pass  # Already removed by hand
+        except Exception as e:
+            print(ctext(f"  ⚠️  Could not delete {file_path}: {e}", Fore.RED))
+
+    if rebuilt or evicted:
+        save_deleted_index(deleted_dir, index)
 
     if deleted_count > 0:
         print(ctext(
             f"🧹 Cleaned up {deleted_count} files older than {days} days",
             Fore.GREEN,
         ))
+    return index
 
 
-def move_to_deleted(file_path, deleted_dir="deleted"):
-    """Move a file to the deleted directory instead of permanently deleting it"""
-    if not os.path.exists(deleted_dir):
-        os.makedirs(deleted_dir)
+def move_to_deleted(file_path, deleted_dir="deleted", index=None):
+    """Move a file to the deleted directory instead of permanently deleting it.
+
+    With an index (from clean_old_deleted_files) the entry is only pushed
+    onto it, and the caller saves it once after moving several files;
+    otherwise the index file is updated right away.
+    """
+    os.makedirs(deleted_dir, exist_ok=True)
 
     filename = os.path.basename(file_path)
-    deleted_path = os.path.join(deleted_dir, filename)
 
     # If file already exists in deleted, add timestamp
-    if os.path.exists(deleted_path):
+    if os.path.lexists(os.path.join(deleted_dir, filename)):
         name, ext = os.path.splitext(filename)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        deleted_path = os.path.join(deleted_dir, f"{name}_{timestamp}{ext}")
+        filename = f"{name}_{timestamp}{ext}"
+    deleted_path = os.path.join(deleted_dir, filename)
+
+    save = index is None
+    if save:
+        index = load_deleted_index(deleted_dir)
+        if index is None:
+            index = rebuild_deleted_index(deleted_dir)
 
     try:
-        shutil.move(file_path, deleted_path)
-        return True
+        try:
+            # deleted/ normally lives on the same filesystem: one rename
+            os.rename(file_path, deleted_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(file_path, deleted_path)
     except Exception as e:
         print(ctext(
             f"  ❌ Failed to move {file_path} to deleted folder: {e}",
@@ -135,21 +237,51 @@ def move_to_deleted(file_path, deleted_dir="deleted"):
         ))
         return False
 
+    # Record the deletion so clean_old_deleted_files can expire it later.
+    # An older entry for the same name is left in place: it no longer
+    # matches the file's identity, so cleanup drops it without deleting.
+    try:
+        st = os.lstat(deleted_path)
+    except OSError:
+        return True
+    heapq.heappush(index, _deleted_entry(time.time(), filename, st))
+    if save:
+        save_deleted_index(deleted_dir, index)
+    return True
+
+
+class TransferAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections send request bodies in large blocks.
+
+    urllib3 reads upload bodies (the multipart encoder) 16 KiB at a time by
+    default; matching TRANSFER_CHUNK_SIZE cuts the Python-level reads and
+    socket writes per upload by ~64x. urllib3 1.x has no blocksize option.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        if int(urllib3.__version__.split(".")[0]) >= 2:
+            kwargs.setdefault("blocksize", TRANSFER_CHUNK_SIZE)
+        super().init_poolmanager(*args, **kwargs)
+
 
 def make_session():
     """Create a requests session with retry configuration"""
     session = requests.Session()
+    session.headers.update({"User-Agent": "syncz/1"})
     
-    # Create a retry strategy
+    # Create a retry strategy (short backoff: the server is on the LAN)
     retry_strategy = Retry(
         total=3,
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["HEAD", "GET", "OPTIONS", "POST"],
-        backoff_factor=1
+        backoff_factor=0.2
     )
     
-    # Create an adapter with the retry strategy
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    # Create an adapter with the retry strategy, sized for parallel transfers
+    adapter = TransferAdapter(
+        max_retries=retry_strategy,
+        pool_maxsize=TRANSFER_WORKERS,
+    )
     
     # Mount the adapter to the session
     session.mount("http://", adapter)
@@ -158,14 +290,42 @@ def make_session():
     return session
 
 
-def upload_with_rich(session, file_path, upload_url, server_config, mtime=None):
+_session = None
+
+
+def get_session():
+    """Return the module-wide session so every request reuses its sockets"""
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+
+def download_file(session, base_url, root, name, mtime_ns):
+    """Download a file into root and restore its mtime"""
+    dest = os.path.join(root, name)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    dl = session.get(f"{base_url}/{name}", stream=True)
+    dl.raise_for_status()
+    # Copy straight from the socket in large blocks; the loop runs in C
+    dl.raw.decode_content = True
+    with open(dest, "wb") as f:
+        shutil.copyfileobj(dl.raw, f, TRANSFER_CHUNK_SIZE)
+    os.utime(dest, ns=(mtime_ns, mtime_ns))
+    return os.path.getsize(dest)
+
+
+def upload_with_rich(session, file_path, upload_url, server_config, mtime_ns=None):
     """Upload a file without showing progress bars (silent upload)."""
     try:
         with open(file_path, 'rb') as f:
             # Create the multipart encoder with file and optional mtime
             fields = {'file': (os.path.basename(file_path), f, 'application/octet-stream')}
-            if mtime:
-                fields['mtime'] = str(mtime)
+            if mtime_ns:
+                # Integer nanoseconds survive the round trip exactly;
+                # mtime is kept for servers that predate mtime_ns
+                fields['mtime_ns'] = str(mtime_ns)
+                fields['mtime'] = str(mtime_ns / 1e9)
 
             encoder = MultipartEncoder(fields=fields)
 
@@ -174,7 +334,7 @@ def upload_with_rich(session, file_path, upload_url, server_config, mtime=None):
                 upload_url,
                 data=encoder,
                 headers={'Content-Type': encoder.content_type},
-                timeout=300
+                timeout=(10, 300)  # fail fast on connect, allow slow bodies
             )
 
             return response
@@ -183,27 +343,42 @@ def upload_with_rich(session, file_path, upload_url, server_config, mtime=None):
         return None
 
 
-def generate_file_list(root_dir):
-    rows = []
-    for dirpath, _, filenames in os.walk(root_dir):
-        # Skip the deleted directory and its subdirectories
-        if "deleted" in os.path.relpath(dirpath, root_dir).split(os.sep):
+def row_mtime_ns(m):
+    """Integer mtime of a metadata row, falling back to the float field"""
+    mtime_ns = m.get("mtime_ns")
+    if mtime_ns is None:
+        return round(m.get("mtime", 0) * 1e9)
+    return mtime_ns
+
+
+def plan_transfers(remote_index, local_by_name):
+    """Decide which files move in which direction.
+
+    remote_index maps name -> (sha256, mtime_ns); local_by_name maps name ->
+    local row. Returns (to_download names, to_upload rows, conflict names).
+    Identical content is never transferred, and timestamps within
+    TIMESTAMP_TOLERANCE count as equal, in which case the server wins.
+    """
+    to_download = []
+    to_upload = []
+    conflicts = []  # equal timestamp but different hash
+    local_get = local_by_name.get
+    for name, (remote_hash, remote_mtime) in remote_index.items():
+        local = local_get(name)
+        if local is None:
+            to_download.append(name)
             continue
-
-        for fname in filenames:
-            # Skip hidden files if needed
-            if fname.startswith("."):
-                continue
-            # Skip JSON files
-            if fname.lower().endswith('.json'):
-                continue
-            full = os.path.join(dirpath, fname)
-            rows.append({
-                "name": os.path.relpath(full, root_dir).replace("\\", "/"),
-                "sha256": sha256sum(full),
-                "mtime": os.path.getmtime(full)
-            })
-    return rows
+        if local["sha256"] == remote_hash:
+            continue
+        diff = remote_mtime - local["mtime_ns"]
+        if diff < -TIMESTAMP_TOLERANCE_NS:
+            # Local newer by tolerance
+            to_upload.append(local)
+        else:
+            if diff <= TIMESTAMP_TOLERANCE_NS:
+                conflicts.append(name)
+            to_download.append(name)
+    return to_download, to_upload, conflicts
 
 
 # --- Configuration ---
@@ -213,17 +388,38 @@ DEFAULT_SERVER_PORT = 8000
 
 # Consider small timestamp differences as equal to avoid ping-pong updates
 TIMESTAMP_TOLERANCE = 1.0  # seconds
+TIMESTAMP_TOLERANCE_NS = int(TIMESTAMP_TOLERANCE * 1_000_000_000)
+# Set SYNCZ_VERBOSE=1 to list per-file upload reasons and the final queue
+VERBOSE = os.environ.get("SYNCZ_VERBOSE") == "1"
+
+# Number of files transferred concurrently over the shared session
+TRANSFER_WORKERS = 8
+# Block size used when streaming downloads to disk
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+
+# Parsed config.json, reused until the file's mtime/size change
+_config_cache = {}
 
 
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            config = json.load(f)
-        if "server_port" not in config and "port" in config:
-            config["server_port"] = config["port"]
-        if "port" not in config and "server_port" in config:
-            config["port"] = config["server_port"]
-        return config
+    try:
+        st = os.stat(CONFIG_FILE)
+    except OSError:
+        st = None
+    if st is not None:
+        key = (st.st_mtime_ns, st.st_size)
+        if _config_cache.get("key") != key:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            if "server_port" not in config and "port" in config:
+                config["server_port"] = config["port"]
+            if "port" not in config and "server_port" in config:
+                config["port"] = config["server_port"]
+            _config_cache["key"] = key
+            _config_cache["config"] = config
+        # Hand out a copy; change_config edits the dict it gets
+        return dict(_config_cache["config"])
     # Default config if not present
     return {
         "path": DEFAULT_PATH,
@@ -278,14 +474,6 @@ def show_current_config():
     print(ctext("=" * 50, Fore.CYAN))
 
 
-def sha256sum(path):
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
 # Server-side move endpoint is no longer used.
 
 
@@ -293,7 +481,8 @@ def request_metadata_regeneration(base_url):
     """Request the server to regenerate its metadata file"""
     try:
         print(ctext("🔄 Requesting server to regenerate metadata...", Fore.YELLOW))
-        response = requests.post(f"{base_url}/regenerate-metadata", timeout=10)
+        response = get_session().post(f"{base_url}/regenerate-metadata",
+                                      timeout=10)
         response.raise_for_status()
         
         result = response.json()
@@ -311,6 +500,64 @@ def request_metadata_regeneration(base_url):
         return False
 
 
+# Last /metadata response and its ETag, so unchanged lists aren't refetched
+REMOTE_METADATA_CACHE = ".syncz_remote_metadata.json"
+
+
+def load_remote_metadata_cache(root_dir):
+    """Return (etag, remote_meta) from the last fetch, or (None, None)"""
+    try:
+        with open(os.path.join(root_dir, REMOTE_METADATA_CACHE), "rb") as f:
+            cached = loads(f.read())
+        return cached["etag"], cached["metadata"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def save_remote_metadata_cache(root_dir, etag, remote_meta):
+    """Persist the fetched metadata; failures only cost a full fetch"""
+    cached = {"etag": etag, "metadata": remote_meta}
+    try:
+        replace_file(os.path.join(root_dir, REMOTE_METADATA_CACHE),
+                     dumps(cached))
+    except OSError:
+        pass
+
+
+# InvalidJSONError is new in requests 2.27; older releases get its base
+_InvalidJSONError = getattr(requests.exceptions, "InvalidJSONError",
+                            requests.exceptions.RequestException)
+
+
+def fetch_metadata_and_scan(metadata_url, path):
+    """Fetch remote metadata while the local tree is hashed in parallel.
+
+    The request is conditional on the last ETag seen, and a 304 reuses the
+    cached list. Returns (remote_meta, local_meta); raises
+    RequestException on failure, including a body that is not JSON.
+    """
+    etag, cached_meta = load_remote_metadata_cache(path)
+    headers = {"If-None-Match": etag} if etag else None
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(get_session().get, metadata_url,
+                              headers=headers, timeout=5)
+        local_meta = generate_file_list(path)
+        resp = pending.result()
+    if resp.status_code == 304 and cached_meta is not None:
+        return cached_meta, local_meta
+    resp.raise_for_status()
+    try:
+        remote_meta = loads(resp.content)
+    except ValueError as e:
+        # Wrong service or port: report it like any other request failure
+        raise _InvalidJSONError(
+            f"Invalid metadata from {metadata_url}: {e}", response=resp) from e
+    etag = resp.headers.get("ETag")
+    if etag:
+        save_remote_metadata_cache(path, etag, remote_meta)
+    return remote_meta, local_meta
+
+
 # --- Progress helpers -------------------------------------------------
 # Progress bar utilities removed as part of simplifying output (no progress bars)
 
@@ -320,6 +567,9 @@ NARROW_EMOJI = {"🖥", "⚙"}
 
 
 def strip_ansi(s: str) -> str:
+    # Most labels carry no escape codes; skip the regex for those
+    if "\x1b" not in s:
+        return s
     return ANSI_RE.sub("", s)
 
 # Fallback emoji detection (used only if wcwidth is unavailable)
@@ -338,7 +588,11 @@ def _is_emoji(ch: str) -> bool:
     )
 
 
+@functools.lru_cache(maxsize=4096)
 def _char_width(ch: str) -> int:
+    # Printable ASCII is always a single cell
+    if " " <= ch <= "~":
+        return 1
     # Handle zero-width characters explicitly in fallback path
     # Variation Selectors and Joiners
     if ord(ch) in (0xFE0E, 0xFE0F, 0x200D, 0x200B, 0x2060):
@@ -361,6 +615,8 @@ def _char_width(ch: str) -> int:
 
 
 def _count_narrow_emoji_clusters(s: str) -> int:
+    if not any(e in s for e in NARROW_EMOJI):
+        return 0
     count = 0
     i = 0
     while i < len(s):
@@ -377,6 +633,7 @@ def _count_narrow_emoji_clusters(s: str) -> int:
     return count
 
 
+@functools.lru_cache(maxsize=1024)
 def visible_width(s: str) -> int:
     s2 = strip_ansi(s)
     if _wcswidth is not None:
@@ -386,10 +643,13 @@ def visible_width(s: str) -> int:
         # Adjust for emojis that render as narrow in many terminals
         w -= _count_narrow_emoji_clusters(s2)
         return max(w, 0)
-    return sum(_char_width(ch) for ch in s2)
+    return sum(map(_char_width, s2))
 
 
 def _truncate_to_width(text: str, width: int) -> str:
+    # Short printable ASCII already fits: one cell per character
+    if len(text) <= width and all(" " <= c <= "~" for c in text):
+        return text
     total = 0
     out = []
     for ch in text:
@@ -440,80 +700,72 @@ def delete_orphan_locals():
     SERVER_PORT = config.get("server_port", DEFAULT_SERVER_PORT)
     BASE_URL = f"http://{SERVER_IP}:{SERVER_PORT}"
     METADATA_URL = f"{BASE_URL}/metadata"
-    DELETED_DIR = "deleted"
 
-    # Clean up old deleted files first
-    clean_old_deleted_files(DELETED_DIR, days=10)
+    if not os.path.isdir(path):
+        print(ctext(f"Sync path {path} is not a directory", Fore.RED))
+        return
+    # Work with paths under the sync root rather than changing directory
+    DELETED_DIR = os.path.join(path, "deleted")
+
+    # Clean up old deleted files first; the index is saved once below
+    deleted_index = clean_old_deleted_files(DELETED_DIR, days=10)
 
-    orig_cwd = os.getcwd()
+    print(ctext("\n🔍 Fetching remote metadata...", Fore.BLUE))
     try:
-        try:
-            os.chdir(path)
-        except Exception as e:
-            print(ctext(f"Failed to change to sync path {path}: {e}", Fore.RED))
-            return
+        remote_meta, local_meta = fetch_metadata_and_scan(METADATA_URL, path)
+        print(ctext("✅ Remote metadata fetched successfully", Fore.GREEN))
+    except requests.exceptions.RequestException as e:
+        print(ctext(f"\n❌ Could not connect to server at {SERVER_IP}:{SERVER_PORT}.", Fore.RED))
+        print(ctext(f"Error: {e}\n⬅️  Returning to main menu.", Fore.RED))
+        time.sleep(2)
+        return
 
-        print(ctext("\n🔍 Fetching remote metadata...", Fore.BLUE))
-        try:
-            resp = requests.get(METADATA_URL, timeout=5)
-            resp.raise_for_status()
-            remote_meta = resp.json()
-            print(ctext("✅ Remote metadata fetched successfully", Fore.GREEN))
-        except requests.exceptions.RequestException as e:
-            print(ctext(f"\n❌ Could not connect to server at {SERVER_IP}:{SERVER_PORT}.", Fore.RED))
-            print(ctext(f"Error: {e}\n⬅️  Returning to main menu.", Fore.RED))
-            time.sleep(2)
-            return
-
-        # Build indices
-        local_meta = generate_file_list(path)
-        remote_index = {m["name"]: True for m in remote_meta}
-
-        to_delete = [
-            m["name"] for m in local_meta
-            if m["name"] != "file_list.json" and m["name"] not in remote_index
-        ]
-
-        if not to_delete:
-            print(ctext("\n✅ No local orphans to delete. Everything matches the server.", Fore.GREEN))
-            return
-
-        print(ctext(f"\n🗑️  Found {len(to_delete)} local files not on server.", Fore.YELLOW))
-        proceed = input(ctext("Proceed to move them into 'deleted/'? (y/N): ", Fore.YELLOW)).strip().lower()
-        if proceed not in ("y", "yes"):
-            print(ctext("Cancelled.", Fore.YELLOW))
-            return
-
-        for name in to_delete:
-            # Ask confirmation before deleting PDF files
-            if name.lower().endswith('.pdf'):
-                while True:
-                    confirm = input(f"Move PDF file '{name}' to deleted folder? (y/n): ").strip().lower()
-                    if confirm in ['y', 'yes']:
-                        break
-                    elif confirm in ['n', 'no']:
-                        print(f"Skipping deletion of {name}")
-                        name = None
-                        break
-                    else:
-                        print("Please answer y or n.")
-                if not name:
-                    continue
+    # Local-only names; iter_file_list never lists .json files, so
+    # file_list.json needs no special case
+    remote_names = {m["name"] for m in remote_meta}
+    to_delete = [
+        m["name"] for m in local_meta if m["name"] not in remote_names
+    ]
+
+    if not to_delete:
+        print(ctext("\n✅ No local orphans to delete. Everything matches the server.", Fore.GREEN))
+        return
 
-            print(ctext(f"  📁 Moving {name} to deleted folder...", Fore.YELLOW))
-            file_path = os.path.join(".", name)
-            if os.path.exists(file_path):
-                if move_to_deleted(file_path, DELETED_DIR):
-                    print(ctext("  ✅ Moved (permanent deletion in 10 days)", Fore.GREEN))
+    print(ctext(f"\n🗑️  Found {len(to_delete)} local files not on server.", Fore.YELLOW))
+    proceed = input(ctext("Proceed to move them into 'deleted/'? (y/N): ", Fore.YELLOW)).strip().lower()
+    if proceed not in ("y", "yes"):
+        print(ctext("Cancelled.", Fore.YELLOW))
+        return
+
+    moved = False
+    for name in to_delete:
+        # Ask confirmation before deleting PDF files
+        if name.lower().endswith('.pdf'):
+            while True:
+                confirm = input(f"Move PDF file '{name}' to deleted folder? (y/n): ").strip().lower()
+                if confirm in ['y', 'yes']:
+                    break
+                elif confirm in ['n', 'no']:
+                    print(f"Skipping deletion of {name}")
+                    name = None
+                    break
                 else:
-                    print(ctext(f"  ❌ Failed to move {name}", Fore.RED))
+                    print("Please answer y or n.")
+            if not name:
+                continue
+
+        print(ctext(f"  📁 Moving {name} to deleted folder...", Fore.YELLOW))
+        file_path = os.path.join(path, name)
+        if os.path.exists(file_path):
+            if move_to_deleted(file_path, DELETED_DIR, deleted_index):
+                moved = True
+                print(ctext("  ✅ Moved (permanent deletion in 10 days)", Fore.GREEN))
             else:
-                print(ctext(f"  ⚠️  File {name} not found locally", Fore.YELLOW))
-    finally:
-        try:
-            os.chdir(orig_cwd)
-        except Exception:
-            pass
+                print(ctext(f"  ❌ Failed to move {name}", Fore.RED))
+        else:
+            print(ctext(f"  ⚠️  File {name} not found locally", Fore.YELLOW))
+    if moved:
+        save_deleted_index(DELETED_DIR, deleted_index)
 
 
 def preview_sync():
@@ -525,192 +777,140 @@ def preview_sync():
     BASE_URL = f"http://{SERVER_IP}:{SERVER_PORT}"
     METADATA_URL = f"{BASE_URL}/metadata"
 
-    orig_cwd = os.getcwd()
-    try:
-        try:
-            os.chdir(path)
-        except Exception as e:
-            msg = f"Failed to change to sync path {path}: {e}"
-            print(ctext(msg, Fore.RED))
-            return
-
-        # 1. Fetch remote metadata
-        msg = "\n🔍 Fetching remote metadata for preview..."
-        print(ctext(msg, Fore.BLUE))
-        try:
-            resp = requests.get(METADATA_URL, timeout=5)
-            resp.raise_for_status()
-            remote_meta = resp.json()
-            print(ctext("✅ Remote metadata fetched successfully",
-                        Fore.GREEN))
-        except requests.exceptions.RequestException as e:
-            msg = f"\n❌ Could not connect to server at {SERVER_IP}:{SERVER_PORT}."
-            print(ctext(msg, Fore.RED))
-            print(ctext(f"Error: {e}\n⬅️  Returning to main menu.",
-                        Fore.RED))
-            time.sleep(2)
-            return
-
-        # 2. Compute local metadata
-        local_meta = generate_file_list(path)
-
-        remote_index = {
-            m["name"]: (m["sha256"], m.get("mtime", 0))
-            for m in remote_meta
-            if not m["name"].lower().endswith('.json')
-        }
-        local_index = {
-            m["name"]: (m["sha256"], m.get("mtime", 0))
-            for m in local_meta
-            if not m["name"].lower().endswith('.json')
-        }
-
-        # 3. Calculate what would be downloaded
-        to_download = [
-            name for name, (remote_hash, remote_mtime) in remote_index.items()
-            if (
-                name not in local_index or
-                local_index[name][1] < remote_mtime
-            )
-        ]
-
-        # 4. Find orphaned files first (local files not on server)
-        orphans = [
-            m for m in local_meta
-            if (
-                not m["name"].lower().endswith('.json')
-                and m["name"] not in remote_index
-            )
-        ]
-
-        # 5. Calculate what would be uploaded (EXCLUDING orphans)
-        to_upload = [
-            m for m in local_meta
-            if (
-                not m["name"].lower().endswith('.json')
-                and m["name"] in remote_index  # Only files that exist on server
-                and (
-                    remote_index.get(m["name"], ("", 0))[0] != m["sha256"] or
-                    remote_index.get(m["name"], ("", 0))[1] < m["mtime"]
-                )
-            )
-        ]
-
-        # 6. Display preview results
-        print(ctext("\n" + "=" * 60, Fore.CYAN))
-        print(ctext("📋 SYNC PREVIEW - Files that would be affected",
-                    Fore.CYAN))
-        print(ctext("=" * 60, Fore.CYAN))
-
-        # Downloads
-        if to_download:
-            msg = f"\n⬇️  DOWNLOADS ({len(to_download)} files):"
-            print(ctext(msg, Fore.MAGENTA))
-            for name in to_download:
-                if name in local_index:
-                    reason = "Local file is older"
-                else:
-                    reason = "New file from server"
-                print(ctext(f"  📥 {name}", Fore.CYAN))
-                print(ctext(f"      Reason: {reason}", Fore.WHITE))
-        else:
-            print(ctext("\n⬇️  DOWNLOADS: None", Fore.GREEN))
+    if not os.path.isdir(path):
+        print(ctext(f"Sync path {path} is not a directory", Fore.RED))
+        return
 
-        # Uploads
-        if to_upload:
-            msg = f"\n⬆️  UPLOADS ({len(to_upload)} files):"
-            print(ctext(msg, Fore.GREEN))
-            for m in to_upload:
-                name = m["name"]
-                if name in remote_index:
-                    local_hash = m["sha256"]
-                    local_mtime = m["mtime"]
-                    remote_hash, remote_mtime = remote_index[name]
-                    
-                    reasons = []
-                    if local_hash != remote_hash:
-                        reasons.append("Hash differs")
-                    if local_mtime > remote_mtime:
-                        reasons.append("Local newer")
-                    reason = (", ".join(reasons) if reasons
-                              else "Different content")
-                else:
-                    reason = "New file (not on server)"
-                
-                print(ctext(f"  📤 {name}", Fore.CYAN))
-                print(ctext(f"      Reason: {reason}", Fore.WHITE))
-        else:
-            print(ctext("\n⬆️  UPLOADS: None", Fore.GREEN))
+    # 1. Fetch remote metadata
+    msg = "\n🔍 Fetching remote metadata for preview..."
+    print(ctext(msg, Fore.BLUE))
+    try:
+        remote_meta, local_meta = fetch_metadata_and_scan(METADATA_URL,
+                                                          path)
+        print(ctext("✅ Remote metadata fetched successfully",
+                    Fore.GREEN))
+    except requests.exceptions.RequestException as e:
+        msg = f"\n❌ Could not connect to server at {SERVER_IP}:{SERVER_PORT}."
+        print(ctext(msg, Fore.RED))
+        print(ctext(f"Error: {e}\n⬅️  Returning to main menu.",
+                    Fore.RED))
+        time.sleep(2)
+        return
 
-        # Orphaned files (would require user decision)
-        if orphans:
-            msg = (f"\n🤔 ORPHANED FILES ({len(orphans)} files) "
-                   "- User decision required:")
-            print(ctext(msg, Fore.YELLOW))
-            msg = "    These files exist locally but not on server:"
-            print(ctext(msg, Fore.WHITE))
-            for m in orphans:
-                print(ctext(f"  📄 {m['name']}", Fore.CYAN))
-            msg = ("\n    📝 Note: In interactive mode, "
-                   "you'll be asked whether to:")
-            print(ctext(msg, Fore.WHITE))
-            print(ctext("         • Upload each file to server", Fore.WHITE))
-            print(ctext("         • Move to deleted folder", Fore.WHITE))
-            print(ctext("         • Skip (leave as-is)", Fore.WHITE))
-            msg = ("    🤖 CLI modes: Use -cu (auto-upload) "
-                   "or -cd (auto-delete)")
-            print(ctext(msg, Fore.WHITE))
-        else:
-            print(ctext("\n🤔 ORPHANED FILES: None", Fore.GREEN))
-
-        # Summary
-        total_changes = len(to_download) + len(to_upload) + len(orphans)
-        print(ctext("\n📊 SUMMARY:", Fore.CYAN))
-        print(ctext(f"    Downloads: {len(to_download)} files", Fore.WHITE))
-        print(ctext(f"    Uploads:   {len(to_upload)} files", Fore.WHITE))
-        msg = f"    Orphans:   {len(orphans)} files (need decision)"
+    # 2. Local metadata was computed alongside the fetch
+    # The server's scanner has always left .json files out of /metadata
+    remote_index = {
+        m["name"]: (m["sha256"], row_mtime_ns(m)) for m in remote_meta
+    }
+    # iter_file_list already leaves out .json files
+    local_by_name = {m["name"]: m for m in local_meta}
+
+    # 3. Same decisions as do_sync, including the timestamp tolerance
+    to_download, to_upload, conflicts = plan_transfers(remote_index,
+                                                       local_by_name)
+    conflict_names = set(conflicts)
+
+    # 4. Local files not on the server need a user decision
+    orphans = [m for m in local_meta if m["name"] not in remote_index]
+
+    # 6. Display preview results
+    print(ctext("\n" + "=" * 60, Fore.CYAN))
+    print(ctext("📋 SYNC PREVIEW - Files that would be affected",
+                Fore.CYAN))
+    print(ctext("=" * 60, Fore.CYAN))
+
+    # Downloads
+    if to_download:
+        msg = f"\n⬇️  DOWNLOADS ({len(to_download)} files):"
+        print(ctext(msg, Fore.MAGENTA))
+        for name in to_download:
+            if name in conflict_names:
+                reason = "Content differs, same time (server wins)"
+            elif name in local_by_name:
+                reason = "Local file is older"
+            else:
+                reason = "New file from server"
+            print(ctext(f"  📥 {name}", Fore.CYAN))
+            print(ctext(f"      Reason: {reason}", Fore.WHITE))
+    else:
+        print(ctext("\n⬇️  DOWNLOADS: None", Fore.GREEN))
+
+    # Uploads
+    if to_upload:
+        msg = f"\n⬆️  UPLOADS ({len(to_upload)} files):"
+        print(ctext(msg, Fore.GREEN))
+        for m in to_upload:
+            print(ctext(f"  📤 {m['name']}", Fore.CYAN))
+            print(ctext("      Reason: Hash differs, local newer",
+                        Fore.WHITE))
+    else:
+        print(ctext("\n⬆️  UPLOADS: None", Fore.GREEN))
+
+    # Orphaned files (would require user decision)
+    if orphans:
+        msg = (f"\n🤔 ORPHANED FILES ({len(orphans)} files) "
+               "- User decision required:")
+        print(ctext(msg, Fore.YELLOW))
+        msg = "    These files exist locally but not on server:"
         print(ctext(msg, Fore.WHITE))
-        msg = f"    Total:     {total_changes} files would be affected"
+        for m in orphans:
+            print(ctext(f"  📄 {m['name']}", Fore.CYAN))
+        msg = ("\n    📝 Note: In interactive mode, "
+               "you'll be asked whether to:")
         print(ctext(msg, Fore.WHITE))
+        print(ctext("         • Upload each file to server", Fore.WHITE))
+        print(ctext("         • Move to deleted folder", Fore.WHITE))
+        print(ctext("         • Skip (leave as-is)", Fore.WHITE))
+        msg = ("    🤖 CLI modes: Use -cu (auto-upload) "
+               "or -cd (auto-delete)")
+        print(ctext(msg, Fore.WHITE))
+    else:
+        print(ctext("\n🤔 ORPHANED FILES: None", Fore.GREEN))
+
+    # Summary
+    total_changes = len(to_download) + len(to_upload) + len(orphans)
+    print(ctext("\n📊 SUMMARY:", Fore.CYAN))
+    print(ctext(f"    Downloads: {len(to_download)} files", Fore.WHITE))
+    print(ctext(f"    Uploads:   {len(to_upload)} files", Fore.WHITE))
+    msg = f"    Orphans:   {len(orphans)} files (need decision)"
+    print(ctext(msg, Fore.WHITE))
+    msg = f"    Total:     {total_changes} files would be affected"
+    print(ctext(msg, Fore.WHITE))
+
+    if total_changes == 0:
+        print(ctext("\n🎉 All files are already synchronized!",
+                    Fore.GREEN))
+    else:
+        msg = "\n💡 To perform actual sync, use option 1 (Merge)"
+        print(ctext(msg, Fore.YELLOW))
 
-        if total_changes == 0:
-            print(ctext("\n🎉 All files are already synchronized!",
-                        Fore.GREEN))
-        else:
-            msg = "\n💡 To perform actual sync, use option 1 (Merge)"
-            print(ctext(msg, Fore.YELLOW))
-
-        print(ctext("\n" + "=" * 60, Fore.CYAN))
-        input(ctext("\nPress Enter to return to main menu...", Fore.YELLOW))
-
-    finally:
-        try:
-            os.chdir(orig_cwd)
-        except Exception:
-            pass
+    print(ctext("\n" + "=" * 60, Fore.CYAN))
+    input(ctext("\nPress Enter to return to main menu...", Fore.YELLOW))
 
 
 def main_menu():
     show_current_config()
     width = 48
+    # The menu never changes, so build it once instead of on every redraw
+    menu = "\n".join([
+        "\n" + box_top(width),
+        box_line(
+            "SyncZ Main Menu",
+            width,
+            content_color=Fore.GREEN,
+            align="center",
+        ),
+        box_sep(width),
+        box_line("1) 🔀 Merge", width),
+        box_line("2) 🖥 Start Server", width),
+        box_line("3) ⚙ Change config (path/ip/port)", width),
+        box_line("4) 📤 Push (delete local orphans)", width),
+        box_line("5) 📋 Preview (show planned changes)", width),
+        box_line("q) 🚪 Quit", width),
+        box_bottom(width),
+    ])
     while True:
-        print(ctext("\n" + box_top(width), None))
-        print(
-            box_line(
-                "SyncZ Main Menu",
-                width,
-                content_color=Fore.GREEN,
-                align="center",
-            )
-        )
-        print(box_sep(width))
-        print(box_line("1) 🔀 Merge", width))
-        print(box_line("2) 🖥 Start Server", width))
-        print(box_line("3) ⚙ Change config (path/ip/port)", width))
-        print(box_line("4) 📤 Push (delete local orphans)", width))
-        print(box_line("5) 📋 Preview (show planned changes)", width))
-        print(box_line("q) 🚪 Quit", width))
-        print(box_bottom(width))
+        print(menu)
 
         choice = input(ctext("Choose an option: ", Fore.YELLOW)).strip().lower()
         if choice == "1":
@@ -803,10 +1003,12 @@ def change_config():
             new_ip = input(ctext("New IP (or press Enter to keep): ",
                                  Fore.GREEN)).strip()
             if new_ip:
-                # Basic IP validation
+                # Basic IP validation (isdigit alone accepts digits such
+                # as "²" that int() rejects, so match ASCII digits only)
                 parts = new_ip.split('.')
                 is_valid = (len(parts) == 4 and
-                            all(part.isdigit() and 0 <= int(part) <= 255
+                            all(re.fullmatch(r"[0-9]{1,3}", part)
+                                and int(part) <= 255
                                 for part in parts))
                 if is_valid:
                     config["server_ip"] = new_ip
@@ -857,7 +1059,8 @@ def change_config():
             try:
                 config["port"] = config.get("server_port", DEFAULT_SERVER_PORT)
                 with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                    json.dump(config, f, indent=2)
+                    f.write(json.dumps(config, indent=2))
+                _config_cache.clear()
                 print(ctext("\n💾 Configuration saved successfully!",
                             Fore.GREEN))
                 break
@@ -895,135 +1098,158 @@ def do_sync(auto_upload=False, auto_delete=False):
     METADATA_URL = f"{BASE_URL}/metadata"
     # Note: we intentionally do not define LOCAL_JSON or a download dir here,
     # as we no longer perform local deletions based on server state.
-    DELETED_DIR = "deleted"
+    if not os.path.isdir(path):
+        print(ctext(f"Sync path {path} is not a directory", Fore.RED))
+        return
+    # Work with paths under the sync root rather than changing directory
+    DELETED_DIR = os.path.join(path, "deleted")
 
-    # Clean up old deleted files first
-    clean_old_deleted_files(DELETED_DIR, days=10)
+    # Clean up old deleted files first; the index is saved once below
+    deleted_index = clean_old_deleted_files(DELETED_DIR, days=10)
 
-    orig_cwd = os.getcwd()
+    # 1. Fetch remote metadata
+    print(ctext("\n🔍 Fetching remote metadata...", Fore.BLUE))
     try:
-        try:
-            os.chdir(path)
-        except Exception as e:
-            print(f"Failed to change to sync path {path}: {e}")
-            return
-        # 1. Fetch remote metadata
-        print(ctext("\n🔍 Fetching remote metadata...", Fore.BLUE))
-        try:
-            resp = requests.get(METADATA_URL, timeout=5)
-            resp.raise_for_status()
-            remote_meta = resp.json()
-            print(ctext("✅ Remote metadata fetched successfully", Fore.GREEN))
-        except requests.exceptions.RequestException as e:
-            print(ctext(f"\n❌ Could not connect to server at {SERVER_IP}:{SERVER_PORT}.", Fore.RED))
-            print(ctext(f"Error: {e}\n⬅️  Returning to main menu.", Fore.RED))
-            time.sleep(2)
-            return
-
-        # 2. Compute local metadata
-        local_meta = generate_file_list(path)
-        with open("file_list.json", "w", encoding="utf-8") as f:
-            json.dump(local_meta, f, indent=2)
-
-        # 3. Skip move detection; we only handle new/modified/orphan files now
-
-        remote_index = {
-            m["name"]: (m["sha256"], m.get("mtime", 0.0))
-            for m in remote_meta
-            if not m["name"].lower().endswith('.json')
-        }
-        local_index = {
-            m["name"]: (m["sha256"], m.get("mtime", 0.0))
-            for m in local_meta
-            if not m["name"].lower().endswith('.json')
-        }
-
-        # Determine actions using timestamps with tolerance to avoid oscillation
-        to_download = []
-        conflicts = []  # equal timestamp but different hash
-        for name, (remote_hash, remote_mtime) in remote_index.items():
-            if name not in local_index:
-                to_download.append(name)
-                continue
-            local_hash, local_mtime = local_index[name]
-            if (remote_mtime - local_mtime) > TIMESTAMP_TOLERANCE:
-                to_download.append(name)
-            elif abs(remote_mtime - local_mtime) <= TIMESTAMP_TOLERANCE and remote_hash != local_hash:
-                # Conflict: same time but different content -> prefer server by default
-                conflicts.append(name)
-                to_download.append(name)
-
-        # Find orphaned files first (local files not on server)
-        orphans = [
-            m for m in local_meta
-            if (
-                not m["name"].lower().endswith('.json')
-                and m["name"] not in remote_index
-            )
-        ]
+        remote_meta, local_meta = fetch_metadata_and_scan(METADATA_URL, path)
+        print(ctext("✅ Remote metadata fetched successfully", Fore.GREEN))
+    except requests.exceptions.RequestException as e:
+        print(ctext(f"\n❌ Could not connect to server at {SERVER_IP}:{SERVER_PORT}.", Fore.RED))
+        print(ctext(f"Error: {e}\n⬅️  Returning to main menu.", Fore.RED))
+        time.sleep(2)
+        return
+
+    # 2. Save local metadata (computed alongside the fetch)
+    write_metadata(local_meta, os.path.join(path, METADATA_PATH))
 
-        # Build upload list only when local is newer by tolerance
-        to_upload = []
-        for m in local_meta:
+    # 3. Skip move detection; we only handle new/modified/orphan files now
+
+    # The server's scanner has always left .json files out of /metadata
+    remote_index = {
+        m["name"]: (m["sha256"], row_mtime_ns(m)) for m in remote_meta
+    }
+    # iter_file_list already leaves out .json files
+    local_by_name = {m["name"]: m for m in local_meta}
+
+    # Determine actions using timestamps with tolerance to avoid oscillation
+    to_download, to_upload, conflicts = plan_transfers(remote_index,
+                                                       local_by_name)
+
+    # Orphans are local files not on server (set difference of names)
+    orphan_names = local_by_name.keys() - remote_index.keys()
+    orphans = [m for m in local_meta if m["name"] in orphan_names]
+    
+    # Debug: Show detailed upload reasons
+    if VERBOSE and to_upload:
+        print(ctext("\n🔍 DEBUG: Files marked for upload:", Fore.YELLOW))
+        for m in to_upload:
             name = m["name"]
-            if name.lower().endswith('.json'):
-                continue
+            local_hash = m["sha256"]
+            local_mtime = m["mtime_ns"]
             if name in remote_index:
                 remote_hash, remote_mtime = remote_index[name]
-                local_hash, local_mtime = m["sha256"], m.get("mtime", 0.0)
-                if (local_mtime - remote_mtime) > TIMESTAMP_TOLERANCE:
-                    to_upload.append(m)
-                # If timestamps are equal within tolerance but hashes differ, we already chose download
-            # Orphans are handled separately below
+                print(ctext(f"  📄 {name}:", Fore.CYAN))
+                reason = "Local newer"
+                print(ctext(f"    Reason: {reason}", Fore.CYAN))
+                print(ctext(f"    Local:  {local_hash[:12]}... @ {local_mtime}", Fore.CYAN))
+                print(ctext(f"    Remote: {remote_hash[:12]}... @ {remote_mtime}", Fore.CYAN))
+                print(ctext(f"    Time diff: {(local_mtime - remote_mtime) / 1e9:.6f}s", Fore.CYAN))
+
+    # Index the upload queue by name so orphans are added in O(1)
+    upload_by_name = {m["name"]: m for m in to_upload}
+
+    # Handle orphan files (local files not on server)
+    moved = False
+    if orphans:
+        print(
+            ctext(
+                f"\nFound {len(orphans)} local files not on server.",
+                Fore.YELLOW,
+            )
+        )
         
-        # Debug: Show detailed upload reasons
-        if to_upload:
-            print(ctext("\n🔍 DEBUG: Files marked for upload:", Fore.YELLOW))
-            for m in to_upload:
+        if auto_upload:
+            msg = "🤖 Auto-upload mode: uploading all orphaned files..."
+            print(ctext(msg, Fore.CYAN))
+            for m in orphans:
+                if m["name"] not in upload_by_name:
+                    upload_by_name[m["name"]] = m
+                    msg = f"  ⬆️  Queued for upload: {m['name']}"
+                    print(ctext(msg, Fore.GREEN))
+        elif auto_delete:
+            msg = ("🤖 Auto-delete mode: moving all orphaned files "
+                   "to deleted folder...")
+            print(ctext(msg, Fore.CYAN))
+            for m in orphans:
                 name = m["name"]
-                local_hash = m["sha256"]
-                local_mtime = m.get("mtime", 0.0)
-                if name in remote_index:
-                    remote_hash, remote_mtime = remote_index[name]
-                    print(ctext(f"  📄 {name}:", Fore.CYAN))
-                    reason = "Local newer"
-                    print(ctext(f"    Reason: {reason}", Fore.CYAN))
-                    print(ctext(f"    Local:  {local_hash[:12]}... @ {local_mtime}", Fore.CYAN))
-                    print(ctext(f"    Remote: {remote_hash[:12]}... @ {remote_mtime}", Fore.CYAN))
-                    print(ctext(f"    Time diff: {local_mtime - remote_mtime:.6f}s", Fore.CYAN))
-
-        # Handle orphan files (local files not on server)
-        if orphans:
-            print(
-                ctext(
-                    f"\nFound {len(orphans)} local files not on server.",
-                    Fore.YELLOW,
-                )
-            )
-            
-            if auto_upload:
-                msg = "🤖 Auto-upload mode: uploading all orphaned files..."
-                print(ctext(msg, Fore.CYAN))
-                for m in orphans:
-                    if not any(x["name"] == m["name"] for x in to_upload):
-                        to_upload.append(m)
-                        msg = f"  ⬆️  Queued for upload: {m['name']}"
-                        print(ctext(msg, Fore.GREEN))
-            elif auto_delete:
-                msg = ("🤖 Auto-delete mode: moving all orphaned files "
-                       "to deleted folder...")
-                print(ctext(msg, Fore.CYAN))
-                for m in orphans:
-                    name = m["name"]
-                    # No need to remove from upload list since orphans
-                    # are not in upload list anymore
+                # No need to remove from upload list since orphans
+                # are not in upload list anymore
+                
+                # Move file to deleted folder
+                fp = os.path.join(path, name)
+                msg = f"  📁 Moving {name} to deleted folder..."
+                print(ctext(msg, Fore.YELLOW))
+                if os.path.exists(fp):
+                    if move_to_deleted(fp, DELETED_DIR, deleted_index):
+                        moved = True
+                        print(
+                            ctext(
+                                "  ✅ Moved (delete in 10 days)",
+                                Fore.GREEN,
+                            )
+                        )
+                    else:
+                        msg = f"  ❌ Failed to move {name}"
+                        print(ctext(msg, Fore.RED))
+                else:
+                    warn = f"  ⚠️  File {name} not found locally"
+                    print(ctext(warn, Fore.YELLOW))
+        else:
+            for m in orphans:
+                print(ctext(f"  📄 {m['name']}", Fore.CYAN))
+            # One answer can cover every orphan instead of a prompt each
+            msg = ("Upload all, delete all, skip all, "
+                   "or decide for each file?")
+            print(ctext(msg, Fore.YELLOW))
+            while True:
+                bulk = input(
+                    "[u]pload/[d]elete/[s]kip/[e]ach? (u/d/s/e): "
+                ).strip().lower()
+                if bulk in ("u", "d", "s", "e"):
+                    break
+                print("Please answer u, d, s, or e.")
+            for m in orphans:
+                name = m["name"]
+                ans = bulk
+                while ans not in ("u", "d", "s"):
+                    prompt = (
+                        f"Orphan: '{name}' -> "
+                        + "[u]pload/[d]elete/[s]kip? (u/d/s): "
+                    )
+                    ans = input(prompt).strip().lower()
+                    if ans not in ("u", "d", "s"):
+                        print("Please answer u, d, or s.")
+
+                if ans == "u":
+                    # Add to upload list (orphans not in upload by default)
+                    upload_by_name.setdefault(name, m)
+                elif ans == "d":
+                    # Ask confirmation for PDFs
+                    if name.lower().endswith(".pdf"):
+                        c = input(
+                            f"Move PDF '{name}' to deleted folder? (y/n): "
+                        ).strip().lower()
+                        if c not in ("y", "yes"):
+                            print("Skipped.")
+                            continue
                     
-                    # Move file to deleted folder
-                    fp = os.path.join(".", name)
+                    # Move file to deleted folder (no need to remove from
+                    # upload list since orphans are not in upload list)
+                    fp = os.path.join(path, name)
                     msg = f"  📁 Moving {name} to deleted folder..."
                     print(ctext(msg, Fore.YELLOW))
                     if os.path.exists(fp):
-                        if move_to_deleted(fp, DELETED_DIR):
+                        if move_to_deleted(fp, DELETED_DIR, deleted_index):
+                            moved = True
                             print(
                                 ctext(
                                     "  ✅ Moved (delete in 10 days)",
@@ -1036,152 +1262,101 @@ def do_sync(auto_upload=False, auto_delete=False):
                     else:
                         warn = f"  ⚠️  File {name} not found locally"
                         print(ctext(warn, Fore.YELLOW))
-            else:
-                msg = "Decide for each: upload, delete, or skip."
+                # For skip option, do nothing (orphan stays as-is)
+    if moved:
+        save_deleted_index(DELETED_DIR, deleted_index)
+
+    # Ensure no file is both in download and upload lists
+    to_download_set = set(to_download)
+    to_upload = [
+        m for name, m in upload_by_name.items()
+        if name not in to_download_set
+    ]
+
+    # Debug: Show final upload list after processing orphans
+    if VERBOSE and to_upload:
+        print(ctext(f"\n📋 Final upload queue: {len(to_upload)} files", Fore.CYAN))
+        for m in to_upload:
+            print(ctext(f"  • {m['name']}", Fore.CYAN))
+    elif to_upload or to_download:
+        msg = (f"\n📋 {len(to_upload)} to upload, "
+               f"{len(to_download)} to download")
+        print(ctext(msg, Fore.CYAN))
+
+    # 4. Download missing/changed
+    session = get_session()
+    if to_download:
+        msg = f"\n⬇️  Downloading {len(to_download)} files..."
+        print(ctext(msg, Fore.MAGENTA))
+        with ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as pool:
+            futures = {
+                pool.submit(download_file, session, BASE_URL, path, name,
+                            remote_index[name][1]): name
+                for name in to_download
+            }
+            for future in as_completed(futures):
+                file_size = future.result()
+                file_size_readable = format_file_size(file_size)
+                msg = (f"    ✅ Downloaded successfully "
+                       f"({file_size_readable})")
+                # One write per file keeps terminal syscalls down
+                print(ctext(f"  📥 {futures[future]}", Fore.CYAN) + "\n"
+                      + ctext(msg, Fore.GREEN))
+
+    # Important: do not delete local-only files.
+    # If a file exists locally but not on the server, treat it as a
+    # candidate for upload (two-way sync behavior).
+    # Deletions would require explicit tombstones or a force-mirror mode,
+    # which we do not implement here to avoid accidental data loss.
+
+    # 5. Upload new/changed (server must implement POST /upload)
+    uploaded = 0
+    if to_upload:
+        print(ctext(f"\n⬆️  Uploading {len(to_upload)} files...", Fore.GREEN))
+
+        # Skip files that no longer exist (e.g., moved to deleted folder);
+        # the same stat gives the size shown in the progress messages
+        pending = []
+        sizes = {}
+        for m in to_upload:
+            try:
+                sizes[m["name"]] = os.path.getsize(os.path.join(path, m["name"]))
+            except OSError:
+                msg = f"  ⏭️  Skipping {m['name']} (file not found)"
                 print(ctext(msg, Fore.YELLOW))
-                for m in orphans:
-                    name = m["name"]
-                    while True:
-                        prompt = (
-                            f"Orphan: '{name}' -> "
-                            + "[u]pload/[d]elete/[s]kip? (u/d/s): "
-                        )
-                        ans = input(prompt).strip().lower()
-                        if ans in ("u", "d", "s"):
-                            break
-                        print("Please answer u, d, or s.")
+                continue
+            pending.append(m)
+
+        upload_url = f"{BASE_URL}/upload"
+        workers = max(1, min(TRANSFER_WORKERS, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(upload_with_rich, session,
+                            os.path.join(path, m["name"]),
+                            upload_url, config, m["mtime_ns"]): m
+                for m in pending
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                m = futures[future]
+                file_size_readable = format_file_size(sizes[m["name"]])
+                filename = m['name']
+                count_info = f"[{i}/{len(pending)}]"
+                size_info = f"({file_size_readable})"
+                msg = f"  📤 {count_info} {filename} {size_info}"
+                print(ctext(msg, Fore.GREEN))
 
-                    if ans == "u":
-                        # Add to upload list (orphans not in upload by default)
-                        if not any(x["name"] == name for x in to_upload):
-                            to_upload.append(m)
-                    elif ans == "d":
-                        # Ask confirmation for PDFs
-                        if name.lower().endswith(".pdf"):
-                            c = input(
-                                f"Move PDF '{name}' to deleted folder? (y/n): "
-                            ).strip().lower()
-                            if c not in ("y", "yes"):
-                                print("Skipped.")
-                                continue
-                        
-                        # Move file to deleted folder (no need to remove from
-                        # upload list since orphans are not in upload list)
-                        fp = os.path.join(".", name)
-                        msg = f"  📁 Moving {name} to deleted folder..."
-                        print(ctext(msg, Fore.YELLOW))
-                        if os.path.exists(fp):
-                            if move_to_deleted(fp, DELETED_DIR):
-                                print(
-                                    ctext(
-                                        "  ✅ Moved (delete in 10 days)",
-                                        Fore.GREEN,
-                                    )
-                                )
-                            else:
-                                msg = f"  ❌ Failed to move {name}"
-                                print(ctext(msg, Fore.RED))
-                        else:
-                            warn = f"  ⚠️  File {name} not found locally"
-                            print(ctext(warn, Fore.YELLOW))
-                    # For skip option, do nothing (orphan stays as-is)
-
-        # Ensure no file is both in download and upload lists
-        to_download_set = set(to_download)
-        to_upload = [m for m in to_upload if m["name"] not in to_download_set]
-
-        # Debug: Show final upload list after processing orphans
-        if to_upload:
-            print(ctext(f"\n📋 Final upload queue: {len(to_upload)} files", Fore.CYAN))
-            for m in to_upload:
-                print(ctext(f"  • {m['name']}", Fore.CYAN))
-
-        # 4. Download missing/changed
-        if to_download:
-            msg = f"\n⬇️  Downloading {len(to_download)} files..."
-            print(ctext(msg, Fore.MAGENTA))
-            for name in to_download:
-                print(ctext(f"  📥 {name}", Fore.CYAN))
-                dir_name = os.path.dirname(name)
-                if dir_name:
-                    os.makedirs(dir_name, exist_ok=True)
-                dl = requests.get(f"{BASE_URL}/{name}", stream=True)
-                dl.raise_for_status()
-                total = int(dl.headers.get("Content-Length", 0) or 0)
-                transferred = 0
-                with open(name, "wb") as f:
-                    for chunk in dl.iter_content(4096):
-                        if not chunk:
-                            continue
-                        f.write(chunk)
-                        transferred += len(chunk)
-                orig_mtime = remote_index[name][1]
-                os.utime(name, (orig_mtime, orig_mtime))
-                
-                # Show download success with file size
                 try:
-                    file_size = os.path.getsize(name)
-                    file_size_readable = format_file_size(file_size)
-                    msg = (f"    ✅ Downloaded successfully "
-                           f"({file_size_readable})")
-                    print(ctext(msg, Fore.GREEN))
-                except OSError:
-                    msg = "    ✅ Downloaded successfully"
-                    print(ctext(msg, Fore.GREEN))
-
-        # Important: do not delete local-only files.
-        # If a file exists locally but not on the server, treat it as a
-        # candidate for upload (two-way sync behavior).
-        # Deletions would require explicit tombstones or a force-mirror mode,
-        # which we do not implement here to avoid accidental data loss.
+                    response = future.result()
 
-        # 5. Upload new/changed (server must implement POST /upload)
-        if to_upload:
-            print(ctext(f"\n⬆️  Uploading {len(to_upload)} files...", Fore.GREEN))
-            
-            # Create session with retry configuration
-            session = make_session()
-            
-            for i, m in enumerate(to_upload, 1):
-                # Skip files that no longer exist (e.g., moved to deleted folder)
-                if not os.path.exists(m["name"]):
-                    msg = f"  ⏭️  Skipping {m['name']} (file not found)"
-                    print(ctext(msg, Fore.YELLOW))
-                    continue
-                
-                # Get file size for upload message
-                try:
-                    file_size = os.path.getsize(m["name"])
-                    file_size_readable = format_file_size(file_size)
-                    filename = m['name']
-                    count_info = f"[{i}/{len(to_upload)}]"
-                    size_info = f"({file_size_readable})"
-                    msg = f"  📤 {count_info} {filename} {size_info}"
-                    print(ctext(msg, Fore.GREEN))
-                except OSError:
-                    msg = f"  📤 [{i}/{len(to_upload)}] {m['name']}"
-                    print(ctext(msg, Fore.GREEN))
-                
-                try:
-                    # Perform upload without a progress bar
-                    upload_url = f"{BASE_URL}/upload"
-                    response = upload_with_rich(session, m["name"], upload_url,
-                                                config, m["mtime"])
-                    
                     if response and response.status_code == 200:
-                        # Get file size for success message
-                        try:
-                            file_size = os.path.getsize(m["name"])
-                            size_readable = format_file_size(file_size)
-                            msg = f"    ✅ Upload completed ({size_readable})"
-                            print(ctext(msg, Fore.GREEN))
-                        except OSError:
-                            print(ctext("    ✅ Upload completed", Fore.GREEN))
+                        uploaded += 1
+                        msg = f"    ✅ Upload completed ({file_size_readable})"
+                        print(ctext(msg, Fore.GREEN))
                     else:
                         status = response.status_code if response else 'None'
                         msg = f"    ❌ Upload failed (HTTP {status})"
                         print(ctext(msg, Fore.RED))
-                    
+
                 except requests.exceptions.Timeout:
                     print(ctext("    ⏰ Upload timed out", Fore.YELLOW))
                     continue
@@ -1199,18 +1374,13 @@ def do_sync(auto_upload=False, auto_delete=False):
                     print(ctext(msg, Fore.RED))
                     continue
 
-        # 6. Update local metadata
-        print(ctext("\n🎉 Sync complete! All files are up to date.", Fore.GREEN))
-        
-        # 7. Request server to regenerate metadata if any files were uploaded or downloaded
-        if to_upload or to_download:
-            request_metadata_regeneration(BASE_URL)
-    finally:
-        # Always restore original working directory after sync
-        try:
-            os.chdir(orig_cwd)
-        except Exception:
-            pass
+    # 6. Update local metadata
+    print(ctext("\n🎉 Sync complete! All files are up to date.", Fore.GREEN))
+    
+    # 7. Downloads leave the server untouched, so its metadata only
+    #    needs rebuilding after at least one successful upload
+    if uploaded:
+        request_metadata_regeneration(BASE_URL)
 
 
 def parse_arguments():
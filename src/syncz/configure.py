@@ -41,7 +41,7 @@ def load_config():
 def save_config(config):
     config = normalize_config(config)
     with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2)
+        f.write(json.dumps(config, indent=2))
     print(f"✅ Saved configuration to {CONFIG_FILE}")
 
 
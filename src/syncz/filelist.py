@@ -0,0 +1,240 @@
+"""Scan a sync folder into metadata rows and write file_list.json.
+
+Shared by the client and the server so both sides hash and list files
+the same way.
+"""
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson is optional; it speeds up metadata encoding/decoding when present
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Encode obj as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """Decode a JSON payload (bytes); raises ValueError if it is not JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Read size for hashing; large blocks keep per-call overhead low
+HASH_CHUNK_SIZE = 1024 * 1024
+# Files at least this big are mmapped and hashed in one call
+MMAP_MIN_SIZE = 2 * 1024 * 1024
+
+# One read buffer per hashing thread, reused across files
+_hash_buffers = threading.local()
+
+
+def _hash_buffer():
+    buf = getattr(_hash_buffers, "buf", None)
+    if buf is None:
+        buf = _hash_buffers.buf = memoryview(bytearray(HASH_CHUNK_SIZE))
+    return buf
+
+
+def sha256sum(path):
+    with open(path, "rb", buffering=0) as f:
+        # Large files: map them and hash in a single update() call
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN_SIZE:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # Ask for aggressive readahead so the disk keeps
+                    # filling pages while earlier ones are being hashed
+                    if hasattr(mm, "madvise"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    h = hashlib.sha256()
+                    h.update(mm)
+                return h.hexdigest()
+            except (ValueError, OSError):
+                # Some FUSE/SMB mounts refuse mmap; read the file instead
+                pass
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(f, hashlib.sha256).hexdigest()
+        h = hashlib.sha256()
+        buf = _hash_buffer()
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(buf[:n])
+    return h.hexdigest()
+
+
+# File list written by generate_file_list callers and served at /metadata
+METADATA_PATH = 'file_list.json'
+
+
+def write_metadata(rows, path=METADATA_PATH):
+    """Stream metadata rows to path as a JSON array and return the row count.
+
+    rows may be any iterable (e.g. iter_file_list), so each row is encoded
+    and written as soon as it is produced. The file is replaced atomically
+    so /metadata never serves a half-written list.
+    """
+    head, tail = os.path.split(path)
+    # Unique temp name so concurrent writers never share a file
+    fd, tmp_path = tempfile.mkstemp(dir=head or ".", prefix=f".{tail}.")
+    count = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"[")
+            for row in rows:
+                f.write(b",\n" if count else b"\n")
+                f.write(dumps(row))
+                count += 1
+            f.write(b"\n]\n" if count else b"]\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+
+# Threads used to hash files in generate_file_list
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+# Sidecar cache of known hashes, keyed by relative path
+HASH_CACHE_FILE = ".syncz_hash_cache.json"
+
+
+def load_hash_cache(root_dir):
+    """Load the (size, mtime_ns, ctime_ns, inode) -> sha256 cache for root_dir"""
+    try:
+        with open(os.path.join(root_dir, HASH_CACHE_FILE), "rb") as f:
+            data = f.read()
+        cache = loads(data)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def replace_file(path, data):
+    """Write data to a unique temp file next to path, then rename it over path.
+
+    Readers never see a torn file and concurrent writers never share a temp
+    file; the temp file is removed if the write fails.
+    """
+    head, tail = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=head or ".", prefix=f".{tail}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def save_hash_cache(root_dir, cache):
+    """Persist the hash cache; failures only cost a re-hash next time"""
+    try:
+        replace_file(os.path.join(root_dir, HASH_CACHE_FILE), dumps(cache))
+    except OSError:
+        pass
+
+
+def iter_file_list(root_dir):
+    """Yield metadata rows in walk order as their hashes become available.
+
+    The hash cache is saved once the generator is exhausted.
+    """
+    cache = load_hash_cache(root_dir)
+    entries = []
+    # Walk with os.scandir so each entry's type and stat come from DirEntry
+    pending_dirs = [(root_dir, "")]
+    while pending_dirs:
+        dirpath, prefix = pending_dirs.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                dir_entries = list(it)
+        except OSError:
+            continue
+
+        for entry in dir_entries:
+            fname = entry.name
+            if entry.is_dir():
+                # Skip the deleted directory and its subdirectories
+                if fname != "deleted" and not entry.is_symlink():
+                    pending_dirs.append((entry.path, prefix + fname + "/"))
+                continue
+            # Skip hidden files and JSON files (metadata, caches, config)
+            if fname[0] == "." or fname[-5:].lower() == ".json":
+                continue
+            entries.append((prefix + fname, entry.path, entry.stat()))
+
+    def cached_digest(name, st):
+        # Quick check (like rsync): reuse the hash if the file is untouched.
+        # ctime catches in-place rewrites whose mtime was set back by utime
+        prev = cache.get(name)
+        if (prev and prev.get("size") == st.st_size
+                and prev.get("mtime_ns") == st.st_mtime_ns
+                and prev.get("ctime_ns") == st.st_ctime_ns
+                and prev.get("ino") == st.st_ino):
+            return prev["sha256"]
+        return None
+
+    digests = [cached_digest(name, st) for name, _, st in entries]
+    misses = [i for i, digest in enumerate(digests) if digest is None]
+
+    # hashlib releases the GIL while hashing, so threads scale across cores.
+    # Only cache misses are hashed; a single miss is hashed inline.
+    pool = None
+    futures = {}
+    if HASH_WORKERS > 1 and len(misses) > 1:
+        pool = ThreadPoolExecutor(max_workers=HASH_WORKERS)
+        # Submit the largest files first so one big PDF doesn't finish last
+        misses.sort(key=lambda i: entries[i][2].st_size, reverse=True)
+        futures = {i: pool.submit(sha256sum, entries[i][1]) for i in misses}
+
+    new_cache = {}
+    try:
+        for i, (name, full, st) in enumerate(entries):
+            digest = digests[i]
+            if digest is None:
+                digest = futures[i].result() if pool else sha256sum(full)
+            new_cache[name] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "ctime_ns": st.st_ctime_ns,
+                "ino": st.st_ino,
+                "sha256": digest,
+            }
+            yield {
+                "name": name,
+                "sha256": digest,
+                "mtime": st.st_mtime,
+                "mtime_ns": st.st_mtime_ns
+            }
+    finally:
+        if pool is not None:
+            # Drop queued work if the caller stopped iterating early
+            for future in futures.values():
+                future.cancel()
+            pool.shutdown()
+    save_hash_cache(root_dir, new_cache)
+
+
+def generate_file_list(root_dir):
+    return list(iter_file_list(root_dir))
@@ -1,16 +1,21 @@
+import gzip
 import http.server
-import hashlib
+import io
 import os
+import shutil
 import json
 import socketserver
+import uuid
 from datetime import datetime
 from pathlib import Path
 
 try:
+    from .filelist import METADATA_PATH, iter_file_list, write_metadata
     from .paths import CONFIG_FILE
 except ImportError:  # pragma: no cover - direct execution fallback
     import sys
     sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+    from syncz.filelist import METADATA_PATH, iter_file_list, write_metadata
     from syncz.paths import CONFIG_FILE
 
 # Try to import colorama for colored output
@@ -65,7 +70,6 @@ def format_file_size(size_bytes):
 # --- Configuration ---
 DEFAULT_PATH = "/home/jorge/zoteroReference"
 DEFAULT_PORT = 8000
-METADATA_PATH = 'file_list.json'
 # These are set in main() so handlers can read the latest values
 path = DEFAULT_PATH
 PORT = DEFAULT_PORT
@@ -120,54 +124,176 @@ def show_server_config(config=None):
     print(ctext("=" * 50, Fore.CYAN))
 
 
-def parse_multipart_form_data(boundary, body):
-    """Simple multipart/form-data parser"""
+# Read size used when streaming request bodies
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _parse_content_disposition(headers):
+    """Return (field_name, filename) from a part's headers; filename may be None"""
+    for line in headers.split('\r\n'):
+        if line.lower().startswith('content-disposition:'):
+            # Extract name from form-data
+            if 'name="' in line:
+                start = line.find('name="') + 6
+                end = line.find('"', start)
+                if end != -1:
+                    field_name = line[start:end]
+                    filename = None
+                    # Check if it's a file field
+                    if 'filename="' in line:
+                        fname_start = line.find('filename="') + 10
+                        fname_end = line.find('"', fname_start)
+                        filename = line[fname_start:fname_end] if fname_end != -1 else 'unknown'
+                    return field_name, filename
+            break
+    return None, None
+
+
+# Name prefix of the hidden temp files uploads are spooled into
+SPOOL_PREFIX = '.upload-'
+
+
+def parse_multipart_upload(rfile, boundary, content_length, spool_dir):
+    """Streaming multipart/form-data parser.
+
+    The body is read in UPLOAD_CHUNK_SIZE pieces. File parts are written to
+    hidden temporary files in spool_dir and returned as
+    {'type': 'file', 'path': ..., 'size': ..., 'filename': ...}; regular
+    fields as {'type': 'field', 'content': str}. Callers own the temp files.
+    """
+    delimiter = b'\r\n--' + boundary
+    keep = len(delimiter) - 1
+    remaining = content_length
+    # A leading CRLF lets the first boundary match the same delimiter
+    buf = b'\r\n'
     parts = {}
-    
-    boundary_bytes = b'--' + boundary
-    sections = body.split(boundary_bytes)
-    
-    for section in sections[1:-1]:  # Skip first empty and last boundary parts
-        if not section.strip():
-            continue
-            
+
+    def fill():
+        nonlocal buf, remaining
+        if remaining <= 0:
+            return False
+        data = rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+        if not data:
+            remaining = 0
+            return False
+        remaining -= len(data)
+        buf += data
+        return True
+
+    # Skip the preamble up to the first boundary
+    while True:
+        idx = buf.find(delimiter)
+        if idx != -1:
+            buf = buf[idx + len(delimiter):]
+            break
+        buf = buf[-keep:]
+        if not fill():
+            return parts
+
+    while True:
+        while len(buf) < 2 and fill():
+            pass
+        if buf.startswith(b'--'):  # Closing boundary
+            break
+
         # Find the headers/body separator
-        header_end = section.find(b'\r\n\r\n')
-        if header_end == -1:
-            continue
-            
-        headers = section[2:header_end].decode('utf-8', errors='ignore')  # Skip leading \r\n
-        content = section[header_end + 4:]  # Skip \r\n\r\n
-        
-        # Remove trailing \r\n if present
-        if content.endswith(b'\r\n'):
-            content = content[:-2]
-        
-        # Parse Content-Disposition header
-        for line in headers.split('\r\n'):
-            if line.lower().startswith('content-disposition:'):
-                # Extract name from form-data
-                if 'name="' in line:
-                    start = line.find('name="') + 6
-                    end = line.find('"', start)
-                    if end != -1:
-                        field_name = line[start:end]
-                        
-                        # Check if it's a file field
-                        if 'filename="' in line:
-                            # Extract filename
-                            fname_start = line.find('filename="') + 10
-                            fname_end = line.find('"', fname_start)
-                            filename = line[fname_start:fname_end] if fname_end != -1 else 'unknown'
-                            parts[field_name] = {'type': 'file', 'content': content, 'filename': filename}
-                        else:
-                            # Regular form field
-                            parts[field_name] = {'type': 'field', 'content': content.decode('utf-8', errors='ignore')}
+        while True:
+            header_end = buf.find(b'\r\n\r\n')
+            if header_end != -1:
                 break
-    
+            if not fill():
+                return parts
+        headers = buf[2:header_end].decode('utf-8', errors='ignore')  # Skip leading \r\n
+        buf = buf[header_end + 4:]
+        field_name, filename = _parse_content_disposition(headers)
+
+        if filename is not None:
+            # Plain open() so the final file gets the usual umask permissions
+            spool_path = os.path.join(spool_dir,
+                                      f'{SPOOL_PREFIX}{uuid.uuid4().hex}')
+            sink = open(spool_path, 'xb')
+        else:
+            sink = io.BytesIO()
+
+        # Copy the part body out, holding back bytes that may start a boundary
+        size = 0
+        try:
+            while True:
+                idx = buf.find(delimiter)
+                if idx != -1:
+                    sink.write(buf[:idx])
+                    size += idx
+                    buf = buf[idx + len(delimiter):]
+                    break
+                if len(buf) > keep:
+                    sink.write(buf[:-keep])
+                    size += len(buf) - keep
+                    buf = buf[-keep:]
+                if not fill():
+                    raise ValueError("Truncated multipart body")
+        except BaseException:
+            sink.close()
+            if filename is not None:
+                os.remove(sink.name)
+            discard_upload_parts(parts)
+            raise
+
+        if field_name is None:
+            sink.close()
+            if filename is not None:
+                os.remove(sink.name)
+        elif filename is not None:
+            sink.close()
+            parts[field_name] = {'type': 'file', 'path': sink.name,
+                                 'size': size, 'filename': filename}
+        else:
+            content = sink.getvalue().decode('utf-8', errors='ignore')
+            parts[field_name] = {'type': 'field', 'content': content}
+
     return parts
 
 
+# Gzipped /metadata body as ((mtime_ns, size), bytes), rebuilt when the
+# file changes so repeated fetches don't recompress it
+_metadata_gzip = None
+
+
+def gzip_metadata(f):
+    """Return the gzipped contents of the open metadata file f"""
+    global _metadata_gzip
+    st = os.fstat(f.fileno())
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _metadata_gzip
+    if cached is None or cached[0] != key:
+        cached = (key, gzip.compress(f.read(), compresslevel=6))
+        _metadata_gzip = cached
+    return cached[1]
+
+
+def discard_upload_parts(parts):
+    """Remove temp files left behind by parse_multipart_upload"""
+    for part in parts.values():
+        if part['type'] == 'file':
+            try:
+                os.remove(part['path'])
+            except FileNotFoundError:
+                pass
+
+
+def remove_stale_spool_files(spool_dir):
+    """Remove spool files left by uploads cut off when the server was killed"""
+    removed = 0
+    with os.scandir(spool_dir) as it:
+        for entry in it:
+            if entry.name.startswith(SPOOL_PREFIX) and entry.is_file(follow_symlinks=False):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
 class SyncHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         # Store upload info for better logging
@@ -237,17 +363,114 @@ class SyncHandler(http.server.SimpleHTTPRequestHandler):
         else:
             print(ctext(f"ℹ️  [{timestamp}] {message}", Fore.CYAN))
     
+    def handle_upload(self, parts):
+        """Validate parsed upload parts and move the file into place"""
+        # Validate required fields
+        if 'file' not in parts:
+            self.send_error(400, "No file field in upload")
+            print(ctext("❌ No file field found", Fore.RED))
+            return
+        
+        file_part = parts['file']
+        if file_part['type'] != 'file':
+            self.send_error(400, "File field is not a file")
+            print(ctext("❌ File field is not a file", Fore.RED))
+            return
+        
+        filename = file_part['filename']
+        file_size_bytes = file_part['size']
+        file_size_readable = format_file_size(file_size_bytes)
+        
+        # Store info for enhanced logging in log_message
+        self.upload_filename = filename
+        self.upload_size = file_size_readable
+        
+        msg = f"📤 Receiving: {filename} ({file_size_readable})"
+        print(ctext(msg, Fore.GREEN))
+        
+        # Get optional fields
+        mtime_ns = 0
+        relpath = None
+        
+        # Prefer the exact integer timestamp; older clients send only mtime
+        if 'mtime_ns' in parts and parts['mtime_ns']['type'] == 'field':
+            try:
+                mtime_ns = int(parts['mtime_ns']['content'])
+            except ValueError:
+                print(ctext("⚠️  Invalid mtime_ns, using 0", Fore.YELLOW))
+        elif 'mtime' in parts and parts['mtime']['type'] == 'field':
+            try:
+                mtime_ns = round(float(parts['mtime']['content']) * 1e9)
+            except ValueError:
+                print(ctext("⚠️  Invalid mtime, using 0", Fore.YELLOW))
+        
+        if 'relpath' in parts and parts['relpath']['type'] == 'field':
+            relpath = parts['relpath']['content']
+        
+        # Determine file path
+        if relpath:
+            # Sanitize path to prevent directory traversal
+            relpath = os.path.normpath(relpath).replace('..', '')
+            filepath = os.path.join(path, relpath)
+            # Create directory if needed
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            final_filename = relpath
+        else:
+            final_filename = filename
+            filepath = os.path.join(path, filename)
+        
+        # Move the spooled file into place
+        os.replace(file_part['path'], filepath)
+        
+        # Set modification time
+        if mtime_ns > 0:
+            os.utime(filepath, ns=(mtime_ns, mtime_ns))
+        
+        # Success message
+        size_readable = format_file_size(file_size_bytes)
+        msg = f"✅ Upload completed: {final_filename} ({size_readable})"
+        print(ctext(msg, Fore.GREEN))
+        
+        # Send success response
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(b'Upload successful')
+
     def do_GET(self):
         if self.path == '/metadata':
+            # Hashes and repeated path prefixes compress very well
+            use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
             try:
                 with open(METADATA_PATH, 'rb') as f:
-                    data = f.read()
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Content-Length', str(len(data)))
-                self.end_headers()
-                self.wfile.write(data)
-                metadata_size = format_file_size(len(data))
+                    st = os.fstat(f.fileno())
+                    size = st.st_size
+                    # Weak tag: the gzipped and plain bodies share it
+                    etag = f'W/"{st.st_mtime_ns:x}-{size:x}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        print(ctext("✅ Metadata unchanged (304)", Fore.GREEN))
+                        return
+                    self.send_response(200)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Vary', 'Accept-Encoding')
+                    if use_gzip:
+                        body = gzip_metadata(f)
+                        self.send_header('Content-Encoding', 'gzip')
+                        self.send_header('Content-Length', str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                    else:
+                        # Stream the file to the socket rather than buffering it
+                        self.send_header('Content-Length', str(size))
+                        self.end_headers()
+                        shutil.copyfileobj(f, self.wfile)
+                metadata_size = format_file_size(size)
+                if use_gzip:
+                    metadata_size += f", {format_file_size(len(body))} gzipped"
                 msg = f"✅ Served metadata ({metadata_size})"
                 print(ctext(msg, Fore.GREEN))
             except FileNotFoundError:
@@ -263,20 +486,18 @@ class SyncHandler(http.server.SimpleHTTPRequestHandler):
             if self.path == '/regenerate-metadata':
                 msg = "🔄 Client requested metadata regeneration..."
                 print(ctext(msg, Fore.YELLOW))
-                data = generate_file_list(os.getcwd())
-                with open("file_list.json", "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=2)
+                file_count = write_metadata(iter_file_list(os.getcwd()))
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 response = {
                     "status": "success",
-                    "message": f"Metadata regenerated with {len(data)} files",
-                    "file_count": len(data)
+                    "message": f"Metadata regenerated with {file_count} files",
+                    "file_count": file_count
                 }
                 self.wfile.write(json.dumps(response).encode())
-                print(ctext(f"✅ Regenerated metadata with {len(data)} files", Fore.GREEN))
+                print(ctext(f"✅ Regenerated metadata with {file_count} files", Fore.GREEN))
                 
             elif self.path == '/move':
                 print(ctext("🔄 Processing file move...", Fore.CYAN))
@@ -346,78 +567,13 @@ class SyncHandler(http.server.SimpleHTTPRequestHandler):
                 
                 boundary = content_type[boundary_start + 9:].strip().encode()
                 
-                # Read and parse the request body
-                body = self.rfile.read(content_length)
-                parts = parse_multipart_form_data(boundary, body)
-                
-                # Validate required fields
-                if 'file' not in parts:
-                    self.send_error(400, "No file field in upload")
-                    print(ctext("❌ No file field found", Fore.RED))
-                    return
-                
-                file_part = parts['file']
-                if file_part['type'] != 'file':
-                    self.send_error(400, "File field is not a file")
-                    print(ctext("❌ File field is not a file", Fore.RED))
-                    return
-                
-                filename = file_part['filename']
-                file_content = file_part['content']
-                file_size_bytes = len(file_content)
-                file_size_readable = format_file_size(file_size_bytes)
-                
-                # Store info for enhanced logging in log_message
-                self.upload_filename = filename
-                self.upload_size = file_size_readable
-                
-                msg = f"📤 Receiving: {filename} ({file_size_readable})"
-                print(ctext(msg, Fore.GREEN))
-                
-                # Get optional fields
-                mtime = 0
-                relpath = None
-                
-                if 'mtime' in parts and parts['mtime']['type'] == 'field':
-                    try:
-                        mtime = float(parts['mtime']['content'])
-                    except ValueError:
-                        print(ctext("⚠️  Invalid mtime, using 0", Fore.YELLOW))
-                
-                if 'relpath' in parts and parts['relpath']['type'] == 'field':
-                    relpath = parts['relpath']['content']
-                
-                # Determine file path
-                if relpath:
-                    # Sanitize path to prevent directory traversal
-                    relpath = os.path.normpath(relpath).replace('..', '')
-                    filepath = os.path.join(path, relpath)
-                    # Create directory if needed
-                    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                    final_filename = relpath
-                else:
-                    final_filename = filename
-                    filepath = os.path.join(path, filename)
-                
-                # Write file
-                with open(filepath, 'wb') as f:
-                    f.write(file_content)
-                
-                # Set modification time
-                if mtime > 0:
-                    os.utime(filepath, (mtime, mtime))
-                
-                # Success message
-                file_size = os.path.getsize(filepath)
-                size_readable = format_file_size(file_size)
-                msg = f"✅ Upload completed: {final_filename} ({size_readable})"
-                print(ctext(msg, Fore.GREEN))
-                
-                # Send success response
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/plain')
-                self.end_headers()
-                self.wfile.write(b'Upload successful')
+                # Stream the request body; file parts are spooled to disk
+                parts = parse_multipart_upload(self.rfile, boundary,
+                                               content_length, path)
+                try:
+                    self.handle_upload(parts)
+                finally:
+                    discard_upload_parts(parts)
                 
             else:
                 self.send_error(404, "POST path not supported")
@@ -437,37 +593,6 @@ class SyncHandler(http.server.SimpleHTTPRequestHandler):
                 print(ctext("❌ Failed to send error response", Fore.RED))
 
 
-def sha256sum(path):
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
-def generate_file_list(root_dir):
-    rows = []
-    for dirpath, _, filenames in os.walk(root_dir):
-        # Skip the deleted directory and its subdirectories
-        if "deleted" in os.path.relpath(dirpath, root_dir).split(os.sep):
-            continue
-            
-        for fname in filenames:
-            # Skip hidden files if needed
-            if fname.startswith("."):
-                continue
-            # Skip JSON files
-            if fname.lower().endswith('.json'):
-                continue
-            full = os.path.join(dirpath, fname)
-            rows.append({
-                "name": os.path.relpath(full, root_dir).replace("\\", "/"),
-                "sha256": sha256sum(full),
-                "mtime": os.path.getmtime(full)
-            })
-    return rows
-
-
 def main():
     global path, PORT
     config = load_config()
@@ -484,16 +609,20 @@ def main():
         print(ctext(f"❌ Failed to change to directory {path}: {e}", Fore.RED))
         return
     
+    stale = remove_stale_spool_files(path)
+    if stale:
+        print(ctext(f"🧹 Removed {stale} unfinished upload(s)", Fore.YELLOW))
+
     print(ctext("\n📋 Generating file metadata...", Fore.YELLOW))
-    data = generate_file_list(path)
-    with open("file_list.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-    print(ctext(f"✅ Generated file_list.json with {len(data)} files", Fore.GREEN))
+    file_count = write_metadata(iter_file_list(path))
+    print(ctext(f"✅ Generated file_list.json with {file_count} files", Fore.GREEN))
 
     Handler = SyncHandler
 
-    class ReuseAddrTCPServer(socketserver.TCPServer):
+    # Threaded so clients can transfer several files at once
+    class ReuseAddrTCPServer(socketserver.ThreadingTCPServer):
         allow_reuse_address = True
+        daemon_threads = True
 
     local_ip = get_primary_ip()
     print(ctext(f"\n🌐 Server starting on all interfaces, port {PORT}...", Fore.CYAN))